@@ -11,8 +11,8 @@ This script scans a directory structure and generates thumbnails for photos and
 videos, compatible with Synology Photo Station / Synology Photos.
 
 This modernized version includes the following improvements:
-- Uses concurrent.futures for modern and efficient multithreading.
-- Automatically determines the optimal number of threads based on CPU cores.
+- Uses concurrent.futures for modern and efficient multiprocessing and multithreading.
+- Automatically determines the optimal number of processes and threads based on CPU cores.
 - Extended support for RAW formats (NEF, DNG, ARW, etc.) via the 'rawpy' library.
 - Extended support for common video formats.
 - Logging is written to a unique, timestamped log file instead of the terminal.
@@ -24,14 +24,19 @@ Requirements:
 - Python 3.6+
 - External commands: 'ffmpeg' must be installed and available in the system's PATH.
 - Python packages: see requirements.txt (pip install -r requirements.txt)
+- Optional: 'pyvips' (with libvips) for faster processing of standard images.
 """
 
 import os
 import sys
+import argparse
 import subprocess
 import logging
+import logging.handlers
+import multiprocessing
 import concurrent.futures
 from datetime import datetime
+from io import BytesIO
 from pathlib import Path
 
 # Try to import external libraries and provide a clear error message if they are missing.
@@ -44,6 +49,14 @@ except ImportError as e:
     print("Please install the required packages using: pip install -r requirements.txt")
     sys.exit(1)
 
+# pyvips (libvips) is optional. When available it is used for standard images.
+try:
+    import pyvips
+    # pyvips forwards all libvips debug messages at INFO; keep only warnings and errors
+    logging.getLogger("pyvips").setLevel(logging.WARNING)
+except (ImportError, OSError):
+    pyvips = None
+
 # --- Configuration ---
 
 # Define thumbnail sizes and filenames.
@@ -54,17 +67,55 @@ THUMBNAIL_CONFIG = {
     "SYNOPHOTO_THUMB_M.jpg": (320, 320),
     "SYNOPHOTO_THUMB_S.jpg": (160, 160),
 }
+# Thumbnails sorted from largest to smallest, for resizing each one from the previous.
+# The XL thumbnail is used to detect whether a file was already processed.
+THUMBNAIL_ITEMS = sorted(THUMBNAIL_CONFIG.items(), key=lambda item: item[1], reverse=True)
+XL_NAME, XL_SIZE = THUMBNAIL_ITEMS[0]
 # Special configuration for the preview thumbnail
 PREVIEW_CONFIG = {
     "name": "SYNOPHOTO_THUMB_PREVIEW.jpg",
     "size": (120, 120) # Adjusted to square for simpler padding
 }
 
+# JPEG encoder settings for the thumbnails. 4:2:0 chroma subsampling and no extra
+# Huffman optimization pass keep encoding fast with no visible loss at these sizes.
+JPEG_SAVE_OPTIONS = {"quality": 85, "subsampling": 2, "optimize": False, "progressive": False}
+PREVIEW_JPEG_SAVE_OPTIONS = {**JPEG_SAVE_OPTIONS, "quality": 80}
+# The same settings for libvips, which uses 4:2:0 subsampling by default below Q 90.
+# Metadata is dropped with 'keep' since libvips 8.15, where 'strip' is deprecated.
+VIPS_JPEG_SAVE_OPTIONS = {"Q": 85}
+if pyvips is not None:
+    if pyvips.at_least_libvips(8, 15):
+        VIPS_JPEG_SAVE_OPTIONS["keep"] = "none"
+    else:
+        VIPS_JPEG_SAVE_OPTIONS["strip"] = True
+PREVIEW_VIPS_JPEG_SAVE_OPTIONS = {**VIPS_JPEG_SAVE_OPTIONS, "Q": 80}
+# Equivalent ffmpeg MJPEG quality (2-31, lower is better) for video thumbnails
+FFMPEG_JPEG_QUALITY = '4'
+
+# EXIF orientation tag and the LibRaw flip values mapped to the matching transpose
+EXIF_ORIENTATION_TAG = 0x0112
+RAW_FLIP_TRANSPOSE = {
+    3: Image.Transpose.ROTATE_180,
+    5: Image.Transpose.ROTATE_90,
+    6: Image.Transpose.ROTATE_270,
+}
+
+# FLV filmstrip for older Synology versions, only generated with --legacy-flv.
+# ':' is not valid in Windows file names (on NTFS it would create an alternate
+# data stream), so it is never generated there.
+FLV_NAME = "SYNOPHOTO:FILM.flv"
+FLV_SUPPORTED = os.name != 'nt'
+
+# Number of videos handled by a single ffmpeg run, to spread its startup cost
+VIDEO_BATCH_SIZE = 4
+
 # Supported file formats
 # rawpy supports most RAW formats from all major brands.
 IMAGE_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff']
 RAW_EXTENSIONS = ['.arw', '.cr2', '.cr3', '.crw', '.dng', '.erf', '.nef', '.nrw', '.orf', '.pef', '.raf', '.raw', '.rw2', '.sr2', '.srf', '.x3f']
 VIDEO_EXTENSIONS = ['.mov', '.m4v', '.mp4', '.avi', '.mkv', '.mpg', '.mpeg', '.wmv', '.3gp', '.flv']
+ALL_EXTENSIONS = frozenset(e.lower() for e in IMAGE_EXTENSIONS + RAW_EXTENSIONS + VIDEO_EXTENSIONS)
 
 # --- Logging Setup ---
 
@@ -88,51 +139,131 @@ def setup_logging():
     
     return log_filename
 
+def setup_worker_logging(log_queue):
+    """Configures logging in a worker process to send all records to the main process.
+
+    The main process writes them through its own handlers with a QueueListener, so
+    the log file has a single writer and errors still reach the console.
+    """
+    root_logger = logging.getLogger()
+    # Forked workers inherit the main process handlers; they must not write directly
+    for handler in root_logger.handlers[:]:
+        root_logger.removeHandler(handler)
+    root_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    root_logger.setLevel(logging.INFO)
+
+def init_image_worker(log_queue):
+    """Initializes an image worker process."""
+    setup_worker_logging(log_queue)
+    # Every CPU core already runs its own worker, so libvips must not start a thread pool per worker
+    if pyvips is not None:
+        pyvips.concurrency_set(1)
+
 # --- Media Processing Functions ---
 
+def load_raw_image(file_path: Path):
+    """Loads a RAW file as an RGB image that is at least as large as the XL thumbnail."""
+    with rawpy.imread(str(file_path)) as raw:
+        # Prefer the embedded JPEG preview when it is large enough, which avoids demosaicing
+        try:
+            thumb = raw.extract_thumb()
+        except rawpy.LibRawError:
+            # No usable preview (missing, unsupported or damaged), demosaic instead
+            thumb = None
+        if thumb is not None and thumb.format == rawpy.ThumbFormat.JPEG:
+            try:
+                img = Image.open(BytesIO(thumb.data))
+                if max(img.size) >= max(XL_SIZE):
+                    # Previews are often full-sensor size; decode at reduced scale before rotating
+                    img.draft('RGB', XL_SIZE)
+                    img.load()
+                    # The preview is stored unrotated; use the sensor orientation unless
+                    # the preview carries its own EXIF orientation (handled by exif_transpose)
+                    if img.getexif().get(EXIF_ORIENTATION_TAG, 1) == 1:
+                        transpose = RAW_FLIP_TRANSPOSE.get(raw.sizes.flip)
+                        if transpose is not None:
+                            img = img.transpose(transpose)
+                    return img.convert('RGB') if img.mode != 'RGB' else img
+            except OSError as e:
+                logging.warning(f"Could not decode the embedded preview of {file_path}: {e}")
+
+        # Postprocess the RAW data into an RGB image array. Half-size demosaicing
+        # still yields far more pixels than the XL thumbnail needs.
+        rgb_array = raw.postprocess(half_size=True, use_camera_wb=True, output_bps=8)
+        return Image.fromarray(rgb_array)
+
+def generate_thumbnails_vips(file_path: Path, thumb_dir: Path):
+    """Generates all thumbnails for a standard image with libvips.
+
+    libvips decodes with shrink-on-load, applies the EXIF rotation and resizes in a
+    single streaming pipeline. The XL result is kept in memory and the smaller
+    sizes are resized from the previous one.
+    """
+    xl_width, xl_height = XL_SIZE
+    img = pyvips.Image.thumbnail(str(file_path), xl_width, height=xl_height, size="down")
+    if img.hasalpha():
+        img = img.flatten()
+    img = img.colourspace("srgb").copy_memory()
+
+    for name, (width, height) in THUMBNAIL_ITEMS:
+        img = img.thumbnail_image(width, height=height, size="down")
+        img.write_to_file(str(thumb_dir / name), **VIPS_JPEG_SAVE_OPTIONS)
+
+    # Generate the special preview thumbnail, padded with black to make it square
+    p_name = PREVIEW_CONFIG['name']
+    p_width, p_height = PREVIEW_CONFIG['size']
+    preview = img.thumbnail_image(p_width, height=p_height, size="down")
+    preview = preview.gravity("centre", p_width, p_height, extend="black")
+    preview.write_to_file(str(thumb_dir / p_name), **PREVIEW_VIPS_JPEG_SAVE_OPTIONS)
+
 def process_image(file_path: Path):
     """Generates thumbnails for a single image file (standard or RAW)."""
     try:
         thumb_dir = file_path.parent / "@eaDir" / file_path.name
         
-        # Check if the XL thumbnail already exists, then skip.
-        if (thumb_dir / list(THUMBNAIL_CONFIG.keys())[0]).exists():
-            return f"Skipped (already exists): {file_path.name}"
-            
         thumb_dir.mkdir(parents=True, exist_ok=True)
         
+        if pyvips is not None and file_path.suffix.lower() not in RAW_EXTENSIONS:
+            try:
+                generate_thumbnails_vips(file_path, thumb_dir)
+                return f"Image processed: {file_path.name}"
+            except (pyvips.Error, UnicodeEncodeError) as e:
+                # e.g. BMP, which libvips can only read through ImageMagick, or file
+                # names that are not valid UTF-8, which pyvips cannot pass to libvips
+                logging.info(f"libvips could not process {file_path}, using Pillow: {e}")
+
         img = None
         if file_path.suffix.lower() in RAW_EXTENSIONS:
-            with rawpy.imread(str(file_path)) as raw:
-                # Postprocess the RAW data into an RGB image array
-                rgb_array = raw.postprocess(use_camera_wb=True, output_bps=8)
-                img = Image.fromarray(rgb_array)
+            img = load_raw_image(file_path)
         else: # Standard image
             img = Image.open(file_path)
+            # Let the JPEG decoder downscale while decoding, no smaller than the XL thumbnail
+            if file_path.suffix.lower() in ('.jpg', '.jpeg'):
+                img.draft('RGB', XL_SIZE)
             # Convert to RGB if necessary
             if img.mode != 'RGB':
                 img = img.convert('RGB')
 
         # Apply rotation based on EXIF data
-        img = ImageOps.exif_transpose(img)
+        ImageOps.exif_transpose(img, in_place=True)
 
-        # Generate all standard thumbnails
-        for name, size in THUMBNAIL_CONFIG.items():
-            img_copy = img.copy()
-            img_copy.thumbnail(size, Image.Resampling.LANCZOS)
-            img_copy.save(thumb_dir / name, "JPEG", quality=95)
+        # Generate all standard thumbnails, largest first. thumbnail() resizes in place,
+        # so each size is resampled from the previous (smaller) result without copying.
+        for name, size in THUMBNAIL_ITEMS:
+            img.thumbnail(size, Image.Resampling.LANCZOS)
+            img.save(thumb_dir / name, "JPEG", **JPEG_SAVE_OPTIONS)
 
-        # Generate the special preview thumbnail with padding
+        # Generate the special preview thumbnail from the smallest thumbnail. BILINEAR is
+        # cheaper than LANCZOS and the difference is not visible at this size.
         p_name = PREVIEW_CONFIG['name']
         p_size = PREVIEW_CONFIG['size']
-        img_copy = img.copy()
-        img_copy.thumbnail(p_size, Image.Resampling.LANCZOS)
-        
-        # Add black padding to make it square
+        img.thumbnail(p_size, Image.Resampling.BILINEAR)
+
+        # Add black padding to make it square (without upscaling small images)
         padded_img = Image.new("RGB", p_size, (0, 0, 0))
-        paste_pos = ((p_size[0] - img_copy.width) // 2, (p_size[1] - img_copy.height) // 2)
-        padded_img.paste(img_copy, paste_pos)
-        padded_img.save(thumb_dir / p_name, "JPEG", quality=90)
+        paste_pos = ((p_size[0] - img.width) // 2, (p_size[1] - img.height) // 2)
+        padded_img.paste(img, paste_pos)
+        padded_img.save(thumb_dir / p_name, "JPEG", **PREVIEW_JPEG_SAVE_OPTIONS)
         
         return f"Image processed: {file_path.name}"
 
@@ -140,46 +271,99 @@ def process_image(file_path: Path):
         logging.error(f"Error processing image {file_path}: {e}")
         return f"Error: {file_path.name}"
 
-def process_video(file_path: Path):
-    """Generates a video filmstrip and thumbnails for a video file."""
+def run_ffmpeg(cmd):
+    """Runs an ffmpeg command, keeping only stderr for error reporting.
+
+    stdin is closed so ffmpeg never waits for interactive input, and stdout is
+    discarded instead of buffered. Raises CalledProcessError on a non-zero exit.
+    """
+    result = subprocess.run(
+        cmd, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+    )
+    if result.returncode:
+        raise subprocess.CalledProcessError(result.returncode, cmd, stderr=result.stderr)
+
+def build_flv_args(flv_path: str, input_index: int = 0):
+    """Builds the ffmpeg output arguments for the FLV filmstrip of one input."""
+    return [
+        '-map', f'{input_index}:v:0', '-map', f'{input_index}:a:0?',
+        '-ar', '44100', '-r', '12', '-ac', '2', '-f', 'flv',
+        '-qscale', '5', '-s', '320x180', flv_path
+    ]
+
+def build_thumbnail_args(thumb_dir: str, trim: bool, input_index: int = 0):
+    """Builds the ffmpeg arguments that write every thumbnail size from a single video frame."""
+    labels = [f"i{input_index}t{i}" for i in range(len(THUMBNAIL_ITEMS))]
+    # Trim to the 1 second mark inside the graph when the input itself was not seeked
+    source = f"[{input_index}:v:0]trim=start=1," if trim else f"[{input_index}:v:0]"
+    graph = [source + f"split={len(labels)}" + "".join(f"[{label}]" for label in labels)]
+    args = []
+    for label, (name, (width, height)) in zip(labels, THUMBNAIL_ITEMS):
+        # Fit inside the box while keeping the aspect ratio and never upscale, like Image.thumbnail
+        graph.append(
+            f"[{label}]scale=w='min({width},iw)':h='min({height},ih)'"
+            f":force_original_aspect_ratio=decrease:flags=lanczos[{label}out]"
+        )
+        args += [
+            '-map', f"[{label}out]", '-frames:v', '1', '-update', '1',
+            '-q:v', FFMPEG_JPEG_QUALITY, os.path.join(thumb_dir, name)
+        ]
+    return ['-filter_complex', ";".join(graph)] + args
+
+def build_video_input_args(video_path: str, make_flv: bool):
+    """Builds the ffmpeg input arguments of one video."""
+    # The filmstrip needs the whole video; without it, seek straight to the 1 second mark
+    if make_flv:
+        return ['-i', video_path]
+    return ['-ss', '00:00:01', '-i', video_path]
+
+def build_video_output_args(thumb_dir: str, make_flv: bool, input_index: int = 0):
+    """Builds the thumbnail and, if requested, the filmstrip output arguments of one input."""
+    args = []
+    if make_flv:
+        args += build_flv_args(os.path.join(thumb_dir, FLV_NAME), input_index)
+    return args + build_thumbnail_args(thumb_dir, trim=make_flv, input_index=input_index)
+
+def process_video(file_path: Path, make_flv: bool = False):
+    """Generates thumbnails, and optionally a video filmstrip, for a video file."""
     try:
         thumb_dir = file_path.parent / "@eaDir" / file_path.name
         
-        # Check if the XL thumbnail already exists, then skip.
-        if (thumb_dir / list(THUMBNAIL_CONFIG.keys())[0]).exists():
-            return f"Skipped (already exists): {file_path.name}"
-            
         thumb_dir.mkdir(parents=True, exist_ok=True)
-        
-        # 1. Generate the FLV filmstrip (optional, for older Synology versions)
-        film_flv_path = thumb_dir / "SYNOPHOTO:FILM.flv"
-        flv_cmd = [
-            'ffmpeg', '-y', '-i', str(file_path), '-loglevel', 'panic',
-            '-ar', '44100', '-r', '12', '-ac', '2', '-f', 'flv',
-            '-qscale', '5', '-s', '320x180', str(film_flv_path)
-        ]
-        subprocess.run(flv_cmd, check=True, capture_output=True)
-
-        # 2. Extract a frame after 1 second for the thumbnails
-        temp_thumb_path = thumb_dir / f"{file_path.stem}_temp.jpg"
-        thumb_cmd = [
-            'ffmpeg', '-y', '-ss', '00:00:01', '-i', str(file_path),
-            '-loglevel', 'panic', '-vframes', '1', str(temp_thumb_path)
-        ]
-        subprocess.run(thumb_cmd, check=True, capture_output=True)
 
-        if not temp_thumb_path.exists():
-            raise FileNotFoundError("FFmpeg failed to extract a thumbnail frame.")
-
-        # 3. Generate the different thumbnail sizes from the frame
-        with Image.open(temp_thumb_path) as img:
-            for name, size in THUMBNAIL_CONFIG.items():
-                img_copy = img.copy()
-                img_copy.thumbnail(size, Image.Resampling.LANCZOS)
-                img_copy.save(thumb_dir / name, "JPEG", quality=95)
+        # Build the ffmpeg arguments from plain strings, converting each path only once
+        video_path = os.fspath(file_path)
+        thumb_dir_path = os.fspath(thumb_dir)
         
-        # Delete the temporary frame
-        temp_thumb_path.unlink()
+        # 1. Generate all thumbnail sizes from the frame after 1 second and, if requested,
+        #    the FLV filmstrip in a single ffmpeg run, so the input is only opened and
+        #    demuxed once.
+        combined_cmd = (
+            ['ffmpeg', '-y'] + build_video_input_args(video_path, make_flv) + ['-loglevel', 'panic']
+            + build_video_output_args(thumb_dir_path, make_flv)
+        )
+        try:
+            run_ffmpeg(combined_cmd)
+        except subprocess.CalledProcessError:
+            # Without the filmstrip the combined run already is the thumbnail pass
+            if not make_flv:
+                raise
+            # Fall back to the two-pass approach for inputs the combined run can't handle
+            logging.warning(f"Combined FFmpeg run failed, retrying in two passes: {file_path}")
+            flv_cmd = (
+                ['ffmpeg', '-y', '-i', video_path, '-loglevel', 'panic']
+                + build_flv_args(os.path.join(thumb_dir_path, FLV_NAME))
+            )
+            run_ffmpeg(flv_cmd)
+
+            thumb_cmd = (
+                ['ffmpeg', '-y', '-ss', '00:00:01', '-i', video_path, '-loglevel', 'panic']
+                + build_thumbnail_args(thumb_dir_path, trim=False)
+            )
+            run_ffmpeg(thumb_cmd)
+
+        if not (thumb_dir / XL_NAME).exists():
+            raise FileNotFoundError("FFmpeg failed to generate the thumbnails.")
 
         return f"Video processed: {file_path.name}"
         
@@ -191,57 +375,192 @@ def process_video(file_path: Path):
         logging.error(f"Error processing video {file_path}: {e}")
         return f"Error: {file_path.name}"
 
+def process_video_batch(file_paths, make_flv: bool = False):
+    """Generates thumbnails (and filmstrips) for several videos with a single ffmpeg run.
+
+    This pays the ffmpeg startup cost once per batch instead of once per video.
+    Videos the batched run did not finish are retried one by one with process_video.
+    """
+    if len(file_paths) == 1:
+        return [process_video(file_paths[0], make_flv)]
+
+    thumb_dirs = [file_path.parent / "@eaDir" / file_path.name for file_path in file_paths]
+    try:
+        batch_cmd = ['ffmpeg', '-y', '-loglevel', 'panic']
+        for file_path in file_paths:
+            batch_cmd += build_video_input_args(os.fspath(file_path), make_flv)
+        for input_index, thumb_dir in enumerate(thumb_dirs):
+            thumb_dir.mkdir(parents=True, exist_ok=True)
+            batch_cmd += build_video_output_args(os.fspath(thumb_dir), make_flv, input_index)
+        run_ffmpeg(batch_cmd)
+    except (subprocess.CalledProcessError, OSError):
+        # The thumbnails are written early, but a filmstrip may have been cut short,
+        # so with filmstrips an existing XL thumbnail does not mean the video is done
+        if make_flv:
+            logging.warning("Batched FFmpeg run failed, retrying all videos one by one.")
+            return [process_video(file_path, make_flv) for file_path in file_paths]
+        logging.warning("Batched FFmpeg run failed, retrying the unfinished videos one by one.")
+
+    # Only retry the videos the batched run did not produce thumbnails for
+    results = []
+    for file_path, thumb_dir in zip(file_paths, thumb_dirs):
+        if (thumb_dir / XL_NAME).exists():
+            results.append(f"Video processed: {file_path.name}")
+        else:
+            results.append(process_video(file_path, make_flv))
+    return results
+
+def walk_media_files(root_dir):
+    """Recursively yields (path, processed) for all supported media files under root_dir.
+
+    Uses os.scandir so only matching files are turned into paths (as strings), and
+    never descends into '@eaDir' thumbnail directories. The '@eaDir' of each
+    directory is listed once while walking, so 'processed' (the XL thumbnail
+    already exists) only costs an extra stat for files with a thumbnail folder.
+    """
+    ea_dir = None
+    media_entries = []
+    sub_dirs = []
+    try:
+        with os.scandir(root_dir) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name == "@eaDir":
+                        ea_dir = entry.path
+                    else:
+                        sub_dirs.append(entry.path)
+                elif entry.is_file():
+                    name = entry.name
+                    dot = name.rfind('.')
+                    if dot >= 0 and name[dot:].lower() in ALL_EXTENSIONS:
+                        media_entries.append(entry)
+    except OSError as e:
+        logging.warning(f"Could not scan directory {root_dir}: {e}")
+        return
+
+    thumb_dirs = set()
+    if ea_dir is not None and media_entries:
+        try:
+            with os.scandir(ea_dir) as entries:
+                thumb_dirs = {entry.name for entry in entries if entry.is_dir()}
+        except OSError as e:
+            logging.warning(f"Could not scan directory {ea_dir}: {e}")
+
+    for entry in media_entries:
+        processed = (
+            entry.name in thumb_dirs
+            and os.path.exists(os.path.join(ea_dir, entry.name, XL_NAME))
+        )
+        yield entry.path, processed
+
+    for sub_dir in sub_dirs:
+        yield from walk_media_files(sub_dir)
+
 # --- Main Function ---
 
 def main():
-    """Finds media, sets up threads, and starts the process."""
-    if len(sys.argv) < 2:
-        print(f"Usage: python {sys.argv[0]} <path_to_photos_or_videos>")
-        sys.exit(1)
-        
-    root_dir = Path(sys.argv[1])
+    """Finds media, sets up the worker pools, and starts the process."""
+    parser = argparse.ArgumentParser(
+        description="Generates thumbnails for Synology Photo Station / Synology Photos."
+    )
+    parser.add_argument("root_dir", type=Path, help="path to the photos or videos")
+    parser.add_argument(
+        "--legacy-flv", action="store_true",
+        help="also generate the FLV filmstrip used by older Photo Station versions "
+             "(slow: re-encodes every video)"
+    )
+    args = parser.parse_args()
+
+    root_dir = args.root_dir
     if not root_dir.is_dir():
         print(f"Error: The directory '{root_dir}' does not exist.")
         sys.exit(1)
 
+    make_flv = args.legacy_flv
+    if make_flv and not FLV_SUPPORTED:
+        print(f"Warning: '{FLV_NAME}' is not a valid file name on this system, skipping the FLV filmstrip.")
+        make_flv = False
+
     log_filename = setup_logging()
     print(f"Logging has started. Details are being saved to: {log_filename}")
     logging.info(f"Script started in directory: {root_dir}")
+    if make_flv:
+        logging.info("Legacy FLV filmstrip generation is enabled.")
 
     print("Searching for media files (this might take a while)...")
-    all_extensions = IMAGE_EXTENSIONS + RAW_EXTENSIONS + VIDEO_EXTENSIONS
-    media_files = [
-        f for f in root_dir.rglob('*') 
-        if f.suffix.lower() in all_extensions and "@eaDir" not in str(f.parent)
-    ]
+    # Files that already have thumbnails are filtered out here, before any work is dispatched
+    media_files = []
+    processed_count = 0
+    for path, processed in walk_media_files(root_dir):
+        if processed:
+            processed_count += 1
+        else:
+            media_files.append(Path(path))
+    total_count = len(media_files) + processed_count
     
-    if not media_files:
+    if not total_count:
         print("No media files found to process.")
         logging.info("No media files found.")
         sys.exit(0)
 
-    print(f"Found {len(media_files)} media files.")
-    logging.info(f"Found {len(media_files)} media files to process.")
+    print(f"Found {total_count} media files.")
+    logging.info(f"Found {total_count} media files.")
+    logging.info(f"Skipped {processed_count} files with existing thumbnails.")
+
+    if not media_files:
+        print("All media files already have thumbnails.")
+        logging.info("No media files left to process.")
+        sys.exit(0)
 
-    # Determine the number of threads (CPU cores, with a max of 32 for I/O-bound tasks)
-    max_workers = min(32, (os.cpu_count() or 1) + 4)
-    logging.info(f"Using {max_workers} threads.")
+    print(f"Generating thumbnails for {len(media_files)} media files.")
+    logging.info(f"Found {len(media_files)} media files to process.")
 
-    tasks = []
+    # Image work (decoding, resizing, encoding) is CPU-bound and holds the GIL, so it runs
+    # in a process pool sized to the CPU cores. Video work mostly waits on ffmpeg
+    # subprocesses, so it stays in a thread pool (with a max of 32 for I/O-bound tasks).
+    cpu_count = os.cpu_count() or 1
+    max_processes = cpu_count
+    max_threads = min(32, cpu_count + 4)
+    logging.info(f"Using {max_processes} processes for images and {max_threads} threads for videos.")
+    if pyvips is not None:
+        logging.info("pyvips is available, using libvips for standard images.")
+
+    image_tasks = []
+    video_tasks = []
     for file_path in media_files:
         if file_path.suffix.lower() in VIDEO_EXTENSIONS:
-            tasks.append((process_video, file_path))
+            video_tasks.append(file_path)
         else:
-            tasks.append((process_image, file_path))
+            image_tasks.append(file_path)
 
-    with tqdm(total=len(tasks), desc="Generating thumbnails", unit="file") as pbar:
-        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-            future_to_task = {executor.submit(func, path): (func, path) for func, path in tasks}
-            
-            for future in concurrent.futures.as_completed(future_to_task):
+    # Log records of the image worker processes are handled here, in the main process
+    log_queue = multiprocessing.Queue()
+    log_listener = logging.handlers.QueueListener(
+        log_queue, *logging.getLogger().handlers, respect_handler_level=True
+    )
+    log_listener.start()
+
+    with tqdm(total=len(media_files), desc="Generating thumbnails", unit="file") as pbar:
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=max_processes,
+            initializer=init_image_worker,
+            initargs=(log_queue,)
+        ) as process_executor, concurrent.futures.ThreadPoolExecutor(max_workers=max_threads) as thread_executor:
+            futures = [process_executor.submit(process_image, path) for path in image_tasks]
+            futures += [
+                thread_executor.submit(process_video_batch, video_tasks[i:i + VIDEO_BATCH_SIZE], make_flv)
+                for i in range(0, len(video_tasks), VIDEO_BATCH_SIZE)
+            ]
+
+            for future in concurrent.futures.as_completed(futures):
                 result = future.result()
-                logging.info(result)
-                pbar.update(1)
+                # Video batches return one result per video
+                results = result if isinstance(result, list) else [result]
+                for message in results:
+                    logging.info(message)
+                pbar.update(len(results))
+
+    log_listener.stop()
 
     print("\nAll tasks completed.")
     logging.info("Script finished successfully.")